@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from ...core.auth import authenticate_request, auth_cache
 from ...core.tenant_resolver import TenantResolver
+from ...services.cache import get_auth_me_cache, set_auth_me_cache, invalidate_auth_me_cache
 from ...models.auth import AuthenticatedUser
 from ...database import supabase
 import logging
-import hashlib
 
 from typing import List, Dict, Any
 
@@ -13,32 +13,24 @@ import asyncio
 router = APIRouter(prefix="/auth", tags=["auth"])
 logger = logging.getLogger(__name__)
 
+async def _fetch_user_departments(user_id: str) -> List[Dict[str, Any]]:
+    """Get user's department assignments with department details; raises on failure."""
+    # Embedded select resolves the department rows in the same round-trip;
+    # supabase-py is synchronous, so run the request off the event loop
+    query = (
+        supabase.service.table("user_departments")
+        .select("department_id, departments!inner(*)")
+        .eq("user_id", user_id)
+    )
+    result = await asyncio.to_thread(query.execute)
+
+    return [row["departments"] for row in result.data or [] if row.get("departments")]
+
+
 async def get_user_departments(user_id: str) -> List[Dict[str, Any]]:
     """Get user's department assignments with department details."""
     try:
-        # Step 1: Get the department IDs for the user
-        user_dept_result = (
-            supabase.service.table("user_departments")
-            .select("department_id")
-            .eq("user_id", user_id)
-            .execute()
-        )
-        if not user_dept_result.data:
-            return []
-
-        department_ids = [item['department_id'] for item in user_dept_result.data]
-        if not department_ids:
-            return []
-
-        # Step 2: Get the details for those departments
-        departments_result = (
-            supabase.service.table("departments")
-            .select("*")
-            .in_("id", department_ids)
-            .execute()
-        )
-        
-        return departments_result.data or []
+        return await _fetch_user_departments(user_id)
     except Exception as e:
         logger.error(f"Error fetching user departments for user {user_id}: {e}")
         return []
@@ -57,86 +49,91 @@ async def get_current_user_info(
     If 'refresh' query parameter is present, clears the auth cache for this user.
     """
     
+    # Computed by authenticate_request for the auth cache
+    token_hash = getattr(request.state, "token_hash", None)
+
     # Check if refresh is requested
     if request.query_params.get('refresh') == 'true':
         # Clear cache for this user's token
-        auth_header = request.headers.get('authorization', '')
-        if auth_header.startswith('Bearer '):
-            token = auth_header[7:]
-            token_hash = hashlib.sha256(token.encode()).hexdigest()[:16]
+        if token_hash:
             if token_hash in auth_cache:
                 logger.info(f"AUTH /me: Clearing cache for user {user.email} on refresh request")
                 del auth_cache[token_hash]
+            await invalidate_auth_me_cache(token_hash)
+    elif token_hash:
+        cached_response = await get_auth_me_cache(token_hash)
+        if cached_response:
+            return cached_response
+
     try:
-        # In parallel, fetch metadata and department assignments
+        # Lookup failures propagate to the gather below so a degraded
+        # response can be kept out of the cache
         async def fetch_metadata():
-            try:
-                admin_resp = supabase.auth.admin.get_user_by_id(user.id)
-                if getattr(admin_resp, "user", None):
-                    u = admin_resp.user
-                    return getattr(u, "user_metadata", None) or None, getattr(u, "app_metadata", None) or None
-            except Exception as meta_err:
-                logger.warning(f"AUTH /me: failed to load metadata for {user.id}: {meta_err}")
+            admin_resp = await asyncio.to_thread(supabase.auth.admin.get_user_by_id, user.id)
+            if getattr(admin_resp, "user", None):
+                u = admin_resp.user
+                return getattr(u, "user_metadata", None) or None, getattr(u, "app_metadata", None) or None
             return None, None
 
-        metadata_task = asyncio.create_task(fetch_metadata())
-        departments_task = asyncio.create_task(get_user_departments(user.id))
-
-        (user_metadata, app_metadata) = await metadata_task
-        departments = await departments_task
-
-        # Get base permissions
-        permissions = [
-            {"section": p.section, "action": p.action} for p in (user.permissions or [])
-        ]
-        
-        # This ensures /auth/me returns correct tenant like other endpoints
-        tenant_id = await TenantResolver.resolve_tenant_id(user_id=user.id, user_email=user.email)
+        async def fetch_smart_views():
+            # Admins see every smart view, so there is nothing to look up.
+            # The tenant filter is applied after the gather because tenant
+            # resolution runs concurrently with this query.
+            if user.is_admin:
+                return []
+            # Get user's assigned, active smart views in a single embedded select
+            smart_views_query = (
+                supabase
+                .table('user_smart_views')
+                .select('smart_view_id, tenant_id, reservation_subsections!inner(id, name)')
+                .eq('user_id', user.id)
+                .eq('reservation_subsections.is_active', True)
+            )
+            smart_views_result = await asyncio.to_thread(smart_views_query.execute)
+            return smart_views_result.data or []
 
-        # TO:
         # Get token payload from request
         token_payload = getattr(request.state, "token_payload", None)
-        tenant_id = await TenantResolver.resolve_tenant_id(
-            user_id=user.id, 
-            user_email=user.email,
-            token_payload=token_payload
+
+        # Metadata, departments, tenant and smart views are independent - fetch them
+        # concurrently; the blocking supabase calls run in worker threads
+        results = await asyncio.gather(
+            fetch_metadata(),
+            _fetch_user_departments(user.id),
+            TenantResolver.resolve_tenant_id(
+                user_id=user.id,
+                user_email=user.email,
+                token_payload=token_payload
+            ),
+            fetch_smart_views(),
+            return_exceptions=True,
         )
+        degraded = False
+        for name, result in zip(("metadata", "departments", "tenant", "smart_views"), results):
+            if isinstance(result, Exception):
+                degraded = True
+                logger.error(f"AUTH /me: {name} lookup failed for {user.email}: {result}")
+
+        user_metadata, app_metadata = results[0] if not isinstance(results[0], Exception) else (None, None)
+        departments = results[1] if not isinstance(results[1], Exception) else []
+        tenant_id = results[2] if not isinstance(results[2], Exception) else None
+        smart_view_rows = results[3] if not isinstance(results[3], Exception) else []
         logger.info(f"AUTH /me: Fresh tenant lookup for {user.email}: {tenant_id}")
-        
-      if tenant_id and not user.is_admin:
-        try:
-        # Get user's assigned smart views from a junction table
-        user_smart_views_result = (
-            supabase
-            .table('user_smart_views')  # Assuming this table exists
-            .select('smart_view_id')
-            .eq('user_id', user.id)
-            .eq('tenant_id', tenant_id)
-            .execute()
-        )
-        
-        assigned_view_ids = [item['smart_view_id'] for item in user_smart_views_result.data]
-        
-        if assigned_view_ids:
-            # Get details for only the assigned smart views
-            smart_views_result = (
-                supabase
-                .table('reservation_subsections')
-                .select('id, name')
-                .in_('id', assigned_view_ids)
-                .eq('is_active', True)
-                .execute()
-            )
-            
-            for view in smart_views_result.data or []:
-                permissions.append({
-                    "section": f"smart_view_{view['id']}",
-                    "action": "read"
-                })
-    except Exception as e:
-        logger.error(f"Failed to fetch user's assigned smart views: {e}")
 
-        return {
+        smart_view_permissions = []
+        if tenant_id and not user.is_admin:
+            for row in smart_view_rows:
+                view = row.get('reservation_subsections')
+                if view and row.get('tenant_id') == tenant_id:
+                    smart_view_permissions.append({
+                        "section": f"smart_view_{view['id']}",
+                        "action": "read"
+                    })
+
+        # Base permissions are precomputed on the cached auth user
+        permissions = user.permissions_payload + smart_view_permissions
+
+        response = {
             "id": user.id,
             "email": user.email,
             "is_admin": user.is_admin,
@@ -148,6 +145,12 @@ async def get_current_user_info(
             "app_metadata": app_metadata,
         }
 
+        # Don't pin a partial response (failed lookup or no tenant) for the cache TTL
+        if token_hash and not degraded and tenant_id:
+            await set_auth_me_cache(token_hash, user.id, response)
+
+        return response
+
     except HTTPException:
         raise
     except Exception as e:
@@ -1,20 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import Dict, Any
-from decimal import Decimal
-from app.services.cache import get_revenue_summary
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import Dict, Any, List
+from app.services.cache import get_revenue_summary, get_revenue_summary_bulk
 from app.core.auth import authenticate_request as get_current_user
-from app.database import supabase
+from app.core.database_pool import get_db_session
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Upper bound on property_ids per bulk request; larger requests get a 422
+MAX_BULK_PROPERTY_IDS = 50
+
 @router.get("/dashboard/summary")
 async def get_dashboard_summary(
     property_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    session=Depends(get_db_session)
 ) -> Dict[str, Any]:
-    
+
     # Get the user's tenant_id
     tenant_id = getattr(current_user, "tenant_id", None)
     if not tenant_id:
@@ -23,47 +26,61 @@ async def get_dashboard_summary(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User not associated with a tenant"
         )
-    
-    #Verify the property belongs to this tenant!
-    try:
-        property_check = (
-            supabase.table("properties")
-            .select("id")
-            .eq("id", property_id)
-            .eq("tenant_id", tenant_id)
-            .execute()
+
+    # Get revenue data; the revenue query also verifies the property belongs
+    # to this tenant, and cache keys are tenant-scoped
+    revenue_data = await get_revenue_summary(property_id, tenant_id, session)
+    if revenue_data is None:
+        logger.warning(f"Property {property_id} not found for tenant {tenant_id}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Property not found or access denied"
         )
-        
-        if not property_check.data:
-            logger.warning(f"Property {property_id} not found for tenant {tenant_id}")
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Property not found or access denied"
-            )
-    except Exception as e:
-        logger.error(f"Error validating property access: {e}")
+
+    return _format_revenue_summary(revenue_data)
+
+
+@router.get("/dashboard/summary/bulk")
+async def get_dashboard_summary_bulk(
+    property_ids: List[str] = Query(..., min_length=1, max_length=MAX_BULK_PROPERTY_IDS),
+    current_user: dict = Depends(get_current_user),
+    session=Depends(get_db_session)
+) -> Dict[str, Any]:
+    """Revenue summaries for several properties in one cache and one DB round-trip."""
+
+    # Get the user's tenant_id
+    tenant_id = getattr(current_user, "tenant_id", None)
+    if not tenant_id:
+        logger.error(f"User {getattr(current_user, 'email', 'unknown')} has no tenant_id")
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error validating property access"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User not associated with a tenant"
         )
-    
-    # Get revenue data (should return Decimal objects)
-    revenue_data = await get_revenue_summary(property_id, tenant_id)
-    
-    # FIX: Return Decimal as string to preserve precision
-    # JSON doesn't support Decimal, so we convert to string
+
+    # Properties that don't belong to this tenant are left out of the result
+    revenue_by_property = await get_revenue_summary_bulk(property_ids, tenant_id, session)
+    missing = [pid for pid in property_ids if pid not in revenue_by_property]
+    if missing:
+        logger.warning(f"Properties {missing} not found for tenant {tenant_id}")
+
+    return {
+        "properties": [
+            _format_revenue_summary(revenue_by_property[pid])
+            for pid in dict.fromkeys(property_ids)
+            if pid in revenue_by_property
+        ]
+    }
+
+
+def _format_revenue_summary(revenue_data: Dict[str, Any]) -> Dict[str, Any]:
+    # calculate_total_revenue formats totals as 2-decimal strings,
+    # which preserves precision in JSON
     total_revenue = revenue_data['total']
-    if isinstance(total_revenue, Decimal):
-        # Format as string with 2 decimal places
-        total_revenue_str = f"{total_revenue:.2f}"
-    else:
-        # If it's already a number, convert properly
-        total_revenue_str = f"{Decimal(str(total_revenue)):.2f}"
-    
+
     return {
         "property_id": revenue_data['property_id'],
-        "total_revenue": total_revenue_str,  # Return as string to preserve precision
+        "total_revenue": total_revenue,  # Return as string to preserve precision
         "total_revenue_float": float(total_revenue),  # Optional: keep float for charts
         "currency": revenue_data['currency'],
         "reservations_count": revenue_data['count']
-    }
\ No newline at end of file
+    }
@@ -7,6 +7,7 @@ import logging
 # Import the tools we need for security and database access
 from ...core.auth import require_permission, require_any_permission, AuthenticatedUser, authenticate_request
 from ...database import supabase
+from ...services.cache import invalidate_user_auth_me_cache, invalidate_users_auth_me_cache
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +15,21 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/departments", tags=["Departments"])
 
 
+def _get_department_member_ids(department_id: UUID) -> List[str]:
+    """Return the ids of users assigned to a department (best effort, for cache invalidation)."""
+    try:
+        result = (
+            supabase.table("user_departments")
+            .select("user_id")
+            .eq("department_id", department_id)
+            .execute()
+        )
+        return [row["user_id"] for row in result.data or []]
+    except Exception as e:
+        logger.warning(f"Failed to load members of department {department_id}: {e}")
+        return []
+
+
 # --- Pydantic Models (Data Shapes) ---
 
 # Defines the data needed to create a new department.
@@ -219,6 +235,8 @@ async def update_department(
                 detail="Could not retrieve updated department.",
             )
 
+        await invalidate_users_auth_me_cache(_get_department_member_ids(department_id))
+
         return select_result.data
     except Exception as e:
         logger.error(f"Failed to update department {department_id}: {e}")
@@ -245,6 +263,9 @@ async def delete_department(
     Requires either departments.delete OR process_management.create permission.
     """
     try:
+        # Collect members before the delete removes their assignments
+        member_ids = _get_department_member_ids(department_id)
+
         # Atomically delete the row only if the tenant_id matches.
         result = (
             supabase.table("departments")
@@ -274,6 +295,8 @@ async def delete_department(
             detail = f"Failed to delete department: {str(e)}"
         raise HTTPException(status_code=status_code, detail=detail)
 
+    await invalidate_users_auth_me_cache(member_ids)
+
     return {"success": True, "message": "Department deleted successfully"}
 
 
@@ -494,6 +517,8 @@ async def update_my_department_preference(
         if not result.data:
             raise Exception("Failed to update preference")
 
+        await invalidate_user_auth_me_cache(user.id)
+
         return {
             "success": True,
             "message": "Department visibility preference updated successfully",
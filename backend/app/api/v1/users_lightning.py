@@ -11,6 +11,7 @@ from ...models.auth import AuthenticatedUser
 from ...database import supabase
 from ...core.tenant_context import get_tenant_id as get_claim_tenant
 from ...core.redis_client import redis_client
+from ...services.cache import invalidate_user_auth_me_cache
 import logging
 import json
 import time
@@ -1307,6 +1308,9 @@ async def update_user(
             invalidate_user_cache(user_id)
             logger.info(f"ℹ️ Local cache invalidation for user {user_id} (Redis not connected)")
 
+        # Cached /auth/me payloads carry permissions and departments
+        await invalidate_user_auth_me_cache(user_id)
+
         # Clear cache
         tenant_result = supabase.service.table("user_tenants")\
             .select("tenant_id")\
@@ -1363,6 +1367,8 @@ async def delete_user(
         if tenant_result.data and redis_client.is_connected:
             cache_key = get_cache_key(tenant_result.data[0]["tenant_id"])
             await redis_client.delete(cache_key)
+
+        await invalidate_user_auth_me_cache(user_id)
         
         return {"message": "User deleted successfully"}
         
@@ -115,8 +115,8 @@ class Settings(BaseSettings):
     supabase_upsell_storage_bucket: str = "upsell-images"
 
     # Database Connection Pool Configuration
-    database_pool_size: int = 20  # Base connection pool size
-    database_max_overflow: int = 30  # Additional connections when needed
+    database_pool_size: int = 10  # Base connection pool size
+    database_max_overflow: int = 40  # Additional connections when needed (50 total)
     database_pool_timeout: int = 30  # Connection timeout in seconds
     database_pool_recycle: int = 3600  # Recycle connections every hour
     database_max_retries: int = 3  # Max retry attempts for failed connections
@@ -1,6 +1,5 @@
-import asyncio
+from fastapi import Request
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.pool import QueuePool
 import logging
 from ..config import settings
 
@@ -12,18 +11,22 @@ class DatabasePool:
         self.session_factory = None
         
     async def initialize(self):
-        """Initialize database connection pool"""
+        """Initialize database connection pool (idempotent)"""
+        if self.engine is not None:
+            return
+
         try:
             # Create async engine with connection pooling
-            database_url = f"postgresql+asyncpg://{settings.supabase_db_user}:{settings.supabase_db_password}@{settings.supabase_db_host}:{settings.supabase_db_port}/{settings.supabase_db_name}"
+            database_url = settings.database_url.replace("postgresql://", "postgresql+asyncpg://", 1)
             
+            # Async engines use AsyncAdaptedQueuePool by default
             self.engine = create_async_engine(
                 database_url,
-                poolclass=QueuePool,
-                pool_size=20,  # Number of connections to maintain
-                max_overflow=30,  # Additional connections when needed
+                pool_size=settings.database_pool_size,  # Number of connections to maintain
+                max_overflow=settings.database_max_overflow,  # Additional connections when needed
+                pool_timeout=settings.database_pool_timeout,
                 pool_pre_ping=True,  # Validate connections
-                pool_recycle=3600,  # Recycle connections every hour
+                pool_recycle=settings.database_pool_recycle,  # Recycle connections every hour
                 echo=False  # Set to True for SQL debugging
             )
             
@@ -44,17 +47,24 @@ class DatabasePool:
         """Close database connections"""
         if self.engine:
             await self.engine.dispose()
+            self.engine = None
+            self.session_factory = None
     
-    async def get_session(self) -> AsyncSession:
+    def get_session(self) -> AsyncSession:
         """Get database session from pool"""
         if not self.session_factory:
             raise Exception("Database pool not initialized")
         return self.session_factory()
 
-# Global database pool instance
+# Global database pool instance, initialized once in the app lifespan
 db_pool = DatabasePool()
 
-async def get_db_session() -> AsyncSession:
-    """Dependency to get database session"""
-    async with db_pool.get_session() as session:
+async def get_db_session(request: Request) -> AsyncSession:
+    """Dependency to get database session from the lifespan-owned pool"""
+    pool = getattr(request.app.state, "db_pool", db_pool)
+    if not pool.session_factory:
+        # Let cache-backed endpoints still serve hits while the DB is down
+        yield None
+        return
+    async with pool.get_session() as session:
         yield session
@@ -1,11 +1,31 @@
 """
 Minimal tenant resolver for authentication.
 """
-from typing import Optional
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
+from cachetools import TTLCache
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# TEMPORARY FALLBACK FOR DEBUGGING - REMOVE IN PRODUCTION
+# Email -> tenant mapping used when the token carries no tenant_id.
+_EMAIL_TENANT: Mapping[str, str] = MappingProxyType({
+    "sunset@propertyflow.com": "tenant-a",
+    "ocean@propertyflow.com": "tenant-b",
+    "candidate@propertyflow.com": "tenant-a",
+})
+
+# Metadata claims that may carry tenant_id, in lookup order
+_METADATA_KEYS = ("user_metadata", "app_metadata")
+
+# Tenancy almost never changes, so fallback resolutions are cached per user
+_tenant_cache = TTLCache(maxsize=10_000, ttl=300)
+# Per-user locks for cold lookups as [lock, users]; an entry is removed once
+# no request holds or waits on it
+_tenant_locks: Dict[str, list] = {}
+
 
 class TenantResolver:
     """Tenant resolver that extracts tenant_id from JWT claims or database."""
@@ -21,19 +41,12 @@ class TenantResolver:
         Returns:
             Tenant ID if found, None otherwise
         """
-        
-        if 'user_metadata' in token_payload:
-            tenant_id = token_payload['user_metadata'].get('tenant_id')
-            if tenant_id:
-                return tenant_id
-
-        # Try app_metadata as fallback
-        if 'app_metadata' in token_payload:
-            tenant_id = token_payload['app_metadata'].get('tenant_id')
+        # Check user_metadata, then app_metadata, then the root level
+        for key in _METADATA_KEYS:
+            tenant_id = (token_payload.get(key) or {}).get('tenant_id')
             if tenant_id:
                 return tenant_id
 
-        # Try root level
         tenant_id = token_payload.get('tenant_id')
         if tenant_id:
             return tenant_id
@@ -52,17 +65,12 @@ class TenantResolver:
         Returns:
             Tenant ID if found, None otherwise
         """
-        # Check various possible locations
+        # Check the root level, then user_metadata, then app_metadata
         if 'tenant_id' in user_data:
             return user_data['tenant_id']
 
-        if 'user_metadata' in user_data:
-            tenant_id = user_data['user_metadata'].get('tenant_id')
-            if tenant_id:
-                return tenant_id
-
-        if 'app_metadata' in user_data:
-            tenant_id = user_data['app_metadata'].get('tenant_id')
+        for key in _METADATA_KEYS:
+            tenant_id = (user_data.get(key) or {}).get('tenant_id')
             if tenant_id:
                 return tenant_id
 
@@ -91,21 +99,51 @@ class TenantResolver:
                 logger.info(f"Resolved tenant {tenant_id} from token for user {user_email}")
                 return tenant_id
         
+        cached_tenant_id = _tenant_cache.get(user_id)
+        if cached_tenant_id:
+            return cached_tenant_id
+
+        # Serialize cold lookups per user so concurrent requests for the same
+        # user don't all hit the fallback path, without blocking other users
+        entry = _tenant_locks.setdefault(user_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                cached_tenant_id = _tenant_cache.get(user_id)
+                if cached_tenant_id:
+                    return cached_tenant_id
+
+                tenant_id = await TenantResolver._resolve_tenant_fallback(user_id, user_email)
+                if tenant_id:
+                    _tenant_cache[user_id] = tenant_id
+                return tenant_id
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _tenant_locks[user_id]
+
+    @staticmethod
+    async def _resolve_tenant_fallback(user_id: str, user_email: str) -> Optional[str]:
+        """
+        Resolve tenant ID when the token does not carry one.
+
+        Args:
+            user_id: User ID
+            user_email: User email
+
+        Returns:
+            Tenant ID or None if not found
+        """
         logger.warning(f"Could not resolve tenant from token for user {user_email}, checking database...")
         
         # In a real implementation, you'd query the database here:
         # SELECT tenant_id FROM users WHERE id = $1 OR email = $2
         
-        # TEMPORARY FALLBACK FOR DEBUGGING - REMOVE IN PRODUCTION
         # This maintains backward compatibility but logs a warning
-        if user_email == "sunset@propertyflow.com":
-            logger.warning(f"Using hardcoded fallback for {user_email} - FIX THIS!")
-            return "tenant-a"
-        if user_email == "ocean@propertyflow.com":
+        tenant_id = _EMAIL_TENANT.get(user_email)
+        if tenant_id:
             logger.warning(f"Using hardcoded fallback for {user_email} - FIX THIS!")
-            return "tenant-b"
-        if user_email == "candidate@propertyflow.com":
-            return "tenant-a"
+            return tenant_id
         
         logger.error(f"Could not resolve tenant for user {user_email}")
         return None  # Return None instead of default tenant
@@ -8,13 +8,14 @@ from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from contextlib import asynccontextmanager
 import logging
 import os
 import time
 
 from app.core.redis_client import redis_client
+from app.services.reservations import RevenueCalcError
 from .api.v1 import (
     users_lightning,
     cities,
@@ -100,6 +101,12 @@ async def lifespan(app: FastAPI):
         logger.error(f"❌ Supabase connection pool initialization failed: {e}")
         # Continue startup - fallback to direct connections
 
+    # Initialize the database pool once for the app lifetime
+    from .core.database_pool import db_pool
+
+    await db_pool.initialize()
+    app.state.db_pool = db_pool
+
     # Initialize Redis connection with timeout
     try:
         await redis_client.initialize()
@@ -127,6 +134,10 @@ async def lifespan(app: FastAPI):
     await async_processor.shutdown()
     logger.info("Async processor shutdown completed")
 
+    # Close database pool
+    await db_pool.close()
+    logger.info("✅ Database connection pool closed")
+
     # Close connection pool
     try:
         from .core.supabase_connection_pool import supabase_pool
@@ -144,6 +155,15 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+@app.exception_handler(RevenueCalcError)
+async def revenue_calc_error_handler(request: Request, exc: RevenueCalcError):
+    """Revenue DB failures are transient; report 503 without a traceback"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Revenue data temporarily unavailable"},
+    )
+
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
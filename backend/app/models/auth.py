@@ -1,3 +1,4 @@
+from functools import cached_property
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
 
@@ -19,3 +20,8 @@ class AuthenticatedUser(BaseModel):
     cities: List[str]
     is_admin: bool
     tenant_id: Optional[str] = None
+
+    @cached_property
+    def permissions_payload(self) -> List[dict]:
+        """Permissions as plain dicts, built once per (cached) auth object. Do not mutate."""
+        return [{"section": p.section, "action": p.action} for p in self.permissions]
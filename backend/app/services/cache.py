@@ -1,74 +1,366 @@
-import json
+import asyncio
+import orjson
 import redis.asyncio as redis
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import os
 import logging
+import uuid
 from decimal import Decimal
 
+# Revenue calculation is delegated to the reservation service.
+from app.services.reservations import (
+    RevenueCalcError,
+    calculate_total_revenue,
+    calculate_total_revenue_batch,
+)
+
+# Seconds to wait for a free pooled connection, and for Redis to connect or reply
+REDIS_POOL_TIMEOUT_SECONDS = 2
+REDIS_SOCKET_TIMEOUT_SECONDS = 2
+
 # Initialize Redis client (typically configured centrally).
-redis_client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+# A bounded blocking pool makes callers wait briefly for a free connection
+# instead of failing once all 64 are in use, and the socket timeouts keep an
+# unreachable Redis from hanging requests. The hiredis C parser is picked up
+# automatically when installed.
+redis_pool = redis.BlockingConnectionPool.from_url(
+    os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+    max_connections=64,
+    timeout=REDIS_POOL_TIMEOUT_SECONDS,
+    socket_connect_timeout=REDIS_SOCKET_TIMEOUT_SECONDS,
+    socket_timeout=REDIS_SOCKET_TIMEOUT_SECONDS,
+    health_check_interval=30,
+)
+redis_client = redis.Redis(connection_pool=redis_pool)
 logger = logging.getLogger(__name__)
 
-class DecimalEncoder(json.JSONEncoder):
-    """Custom JSON encoder for Decimal objects."""
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return str(obj)  # Convert Decimal to string to preserve precision
-        return super().default(obj)
+# /auth/me responses only change when permissions or departments do, so a
+# short TTL keeps repeat SPA calls off Supabase without serving stale data long.
+AUTH_ME_CACHE_TTL = 60
+
+REVENUE_CACHE_TTL = 300
+# Single-flight lock held while one worker computes a missing revenue summary
+REVENUE_LOCK_TTL_MS = 10_000
+REVENUE_LOCK_WAIT_SECONDS = 2.0
+REVENUE_LOCK_POLL_SECONDS = 0.05
+# Delay before re-warming an invalidated summary, so the recompute does not
+# race the transaction that triggered the invalidation
+REVENUE_REWARM_DELAY_SECONDS = 1.0
+
+# Releases the single-flight lock only if it still holds this worker's token;
+# after a TTL expiry the key may belong to another worker
+_release_lock_script = redis_client.register_script(
+    "if redis.call('get', KEYS[1]) == ARGV[1] then "
+    "return redis.call('del', KEYS[1]) "
+    "end "
+    "return 0"
+)
+
+# Strong references to fire-and-forget tasks so they are not garbage collected
+# before they finish
+_background_tasks = set()
+
 
-async def get_revenue_summary(property_id: str, tenant_id: str) -> Dict[str, Any]:
+def _to_cents(amount: Any) -> int:
+    """Convert a money amount (Decimal, str or number) to integer cents."""
+    return int((Decimal(str(amount)) * 100).to_integral_value())
+
+
+def _revenue_to_hash(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flatten a revenue summary into Redis hash fields.
+
+    The total is stored as integer cents to keep it exact.
+    """
+    return {
+        "property_id": result["property_id"],
+        "tenant_id": result["tenant_id"],
+        "total_cents": _to_cents(result["total"]),
+        "currency": result["currency"],
+        "count": result["count"],
+    }
+
+
+def _revenue_from_hash(fields: Dict[bytes, bytes]) -> Optional[Dict[str, Any]]:
+    """
+    Rebuild a revenue summary from the fields returned by HGETALL.
+
+    Returns None for an empty or incomplete hash so callers treat it as a miss.
+    """
+    fields = {k.decode(): v.decode() for k, v in fields.items()}
+    try:
+        return {
+            "property_id": fields["property_id"],
+            "tenant_id": fields["tenant_id"],
+            "total": f"{Decimal(fields['total_cents']) / 100:.2f}",
+            "currency": fields["currency"],
+            "count": int(fields["count"]),
+        }
+    except (KeyError, ArithmeticError, ValueError):
+        return None
+
+
+async def get_revenue_summary(property_id: str, tenant_id: str, session=None) -> Optional[Dict[str, Any]]:
     """
     Fetches revenue summary, utilizing caching to improve performance.
     
     IMPORTANT: Cache keys include BOTH property_id AND tenant_id to prevent
-    cross-tenant data leakage!
+    cross-tenant data leakage! Because of that, a cache hit needs no separate
+    property access check; on a miss the revenue query performs it and None
+    is returned when the property does not belong to the tenant.
     """
     # Include tenant_id in cache key to prevent cross-tenant cache poisoning
     cache_key = f"revenue:{tenant_id}:{property_id}"
     
     try:
         # Try to get from cache
-        cached = await redis_client.get(cache_key)
+        cached = _revenue_from_hash(await redis_client.hgetall(cache_key))
         if cached:
             logger.debug(f"Cache hit for {cache_key}")
-            return json.loads(cached)
+            return cached
         
         logger.debug(f"Cache miss for {cache_key}")
-        
-        # Revenue calculation is delegated to the reservation service.
-        from app.services.reservations import calculate_total_revenue
+
+        # Only one worker computes a missing summary; the others wait for it
+        # to land in the cache instead of stampeding the database.
+        lock_key = f"{cache_key}:lock"
+        lock_token = uuid.uuid4().hex
+        lock_acquired = await redis_client.set(
+            lock_key, lock_token, nx=True, px=REVENUE_LOCK_TTL_MS
+        )
+        if not lock_acquired:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + REVENUE_LOCK_WAIT_SECONDS
+            while loop.time() < deadline:
+                await asyncio.sleep(REVENUE_LOCK_POLL_SECONDS)
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    pipe.hgetall(cache_key)
+                    pipe.exists(lock_key)
+                    fields, lock_held = await pipe.execute()
+                cached = _revenue_from_hash(fields)
+                if cached:
+                    logger.debug(f"Cache filled by another worker for {cache_key}")
+                    return cached
+                if not lock_held:
+                    # The holder gave up without caching (property not found or
+                    # the query failed); take over the lock instead of waiting
+                    # out the deadline
+                    lock_acquired = await redis_client.set(
+                        lock_key, lock_token, nx=True, px=REVENUE_LOCK_TTL_MS
+                    )
+                    if lock_acquired:
+                        break
+            else:
+                logger.warning(f"Timed out waiting for {lock_key}, computing revenue directly")
         
         # Calculate revenue
-        result = await calculate_total_revenue(property_id, tenant_id)
+        try:
+            result = await calculate_total_revenue(property_id, tenant_id, session)
+        except Exception:
+            if lock_acquired:
+                await _release_revenue_lock(lock_key, lock_token)
+            raise
         
-        # FIX: Ensure result has proper format and handle Decimal objects
-        if 'total' in result and isinstance(result['total'], Decimal):
-            # Convert Decimal to string for JSON serialization
-            result['total'] = str(result['total'])
+        if result is None:
+            if lock_acquired:
+                await _release_revenue_lock(lock_key, lock_token)
+            return None
         
-        # Cache the result for 5 minutes
-        await redis_client.setex(
-            cache_key, 
-            300, 
-            json.dumps(result, cls=DecimalEncoder)  # Use custom encoder
-        )
+        # Cache the result as a hash for 5 minutes; MULTI keeps readers from
+        # seeing a partially written hash
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(cache_key)
+            pipe.hset(cache_key, mapping=_revenue_to_hash(result))
+            pipe.expire(cache_key, REVENUE_CACHE_TTL)
+            await pipe.execute()
+        if lock_acquired:
+            await _release_revenue_lock(lock_key, lock_token)
         
         return result
         
+    except RevenueCalcError:
+        raise
     except Exception as e:
         logger.error(f"Error in get_revenue_summary for property {property_id}, tenant {tenant_id}: {e}")
         # Fall back to direct calculation without caching
-        from app.services.reservations import calculate_total_revenue
-        return await calculate_total_revenue(property_id, tenant_id)
+        return await calculate_total_revenue(property_id, tenant_id, session)
+
+
+async def get_revenue_summary_bulk(
+    property_ids: List[str],
+    tenant_id: str,
+    session=None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetches revenue summaries for several properties of one tenant.
+
+    All cache entries are read in one pipelined round-trip and all misses are
+    computed with a single batched query, instead of one cache read and one
+    query per property. Properties that do not belong to the tenant are left
+    out of the result.
+    """
+    property_ids = list(dict.fromkeys(property_ids))
+    if not property_ids:
+        return {}
+
+    cache_keys = [f"revenue:{tenant_id}:{property_id}" for property_id in property_ids]
+
+    try:
+        # Revenue summaries are hashes, so read them with pipelined HGETALLs
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for cache_key in cache_keys:
+                pipe.hgetall(cache_key)
+            cached_values = await pipe.execute()
+
+        summaries = {}
+        misses = []
+        for property_id, fields in zip(property_ids, cached_values):
+            cached = _revenue_from_hash(fields)
+            if cached:
+                summaries[property_id] = cached
+            else:
+                misses.append(property_id)
+
+        logger.debug(f"Bulk revenue cache for tenant {tenant_id}: {len(summaries)} hits, {len(misses)} misses")
+        if not misses:
+            return summaries
+
+        computed = await calculate_total_revenue_batch(misses, tenant_id, session)
+
+        # Cache each computed summary for 5 minutes in one round-trip
+        async with redis_client.pipeline(transaction=True) as pipe:
+            for property_id, result in computed.items():
+                cache_key = f"revenue:{tenant_id}:{property_id}"
+                pipe.delete(cache_key)
+                pipe.hset(cache_key, mapping=_revenue_to_hash(result))
+                pipe.expire(cache_key, REVENUE_CACHE_TTL)
+            await pipe.execute()
+
+        summaries.update(computed)
+        return summaries
+
+    except RevenueCalcError:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_revenue_summary_bulk for tenant {tenant_id}: {e}")
+        # Fall back to direct calculation without caching
+        return await calculate_total_revenue_batch(property_ids, tenant_id, session)
+
+
+async def _release_revenue_lock(lock_key: str, token: str) -> None:
+    """
+    Release a single-flight lock if this worker still owns it.
+    """
+    try:
+        await _release_lock_script(keys=[lock_key], args=[token])
+    except Exception as e:
+        logger.warning(f"Failed to release {lock_key}, it will expire on its own: {e}")
 
 
 async def invalidate_revenue_cache(property_id: str, tenant_id: str) -> None:
     """
     Invalidate cache for a specific property when data changes.
+
+    Call this only after the write has committed. The summary is re-warmed in
+    the background after a short delay so the next dashboard load is a hit.
     """
     cache_key = f"revenue:{tenant_id}:{property_id}"
     try:
         await redis_client.delete(cache_key)
         logger.info(f"Invalidated cache for {cache_key}")
     except Exception as e:
-        logger.error(f"Error invalidating cache for {cache_key}: {e}")
\ No newline at end of file
+        logger.error(f"Error invalidating cache for {cache_key}: {e}")
+        return
+
+    # Re-warm in the background so the next dashboard load is a cache hit
+    task = asyncio.create_task(_warm_revenue_cache(property_id, tenant_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _warm_revenue_cache(property_id: str, tenant_id: str) -> None:
+    """
+    Recompute and cache a revenue summary after invalidation.
+    """
+    await asyncio.sleep(REVENUE_REWARM_DELAY_SECONDS)
+    try:
+        await get_revenue_summary(property_id, tenant_id)
+    except Exception as e:
+        logger.warning(f"Failed to re-warm revenue cache for property {property_id}, tenant {tenant_id}: {e}")
+
+
+async def get_auth_me_cache(token_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the cached /auth/me payload for a token, or None on miss/error.
+    """
+    try:
+        cached = await redis_client.get(f"authme:{token_hash}")
+        if cached:
+            logger.debug(f"Cache hit for authme:{token_hash}")
+            return orjson.loads(cached)
+    except Exception as e:
+        logger.error(f"Error reading /auth/me cache for {token_hash}: {e}")
+    return None
+
+
+async def set_auth_me_cache(token_hash: str, user_id: str, payload: Dict[str, Any]) -> None:
+    """
+    Cache the /auth/me payload for a token.
+
+    The token hash is also tracked in a per-user set so that permission and
+    department changes, which only know the user_id, can drop every cached
+    response belonging to that user.
+    """
+    cache_key = f"authme:{token_hash}"
+    user_key = f"authme:user:{user_id}"
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.setex(cache_key, AUTH_ME_CACHE_TTL, orjson.dumps(payload))
+            pipe.sadd(user_key, token_hash)
+            pipe.expire(user_key, AUTH_ME_CACHE_TTL)
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Error caching /auth/me for {token_hash}: {e}")
+
+
+async def invalidate_auth_me_cache(token_hash: str) -> None:
+    """
+    Invalidate the cached /auth/me payload for a single token.
+    """
+    try:
+        await redis_client.delete(f"authme:{token_hash}")
+        logger.info(f"Invalidated cache for authme:{token_hash}")
+    except Exception as e:
+        logger.error(f"Error invalidating cache for authme:{token_hash}: {e}")
+
+
+async def invalidate_user_auth_me_cache(user_id: str) -> None:
+    """
+    Invalidate every cached /auth/me payload for a user when their
+    permissions or departments change.
+    """
+    await invalidate_users_auth_me_cache([user_id])
+
+
+async def invalidate_users_auth_me_cache(user_ids: List[str]) -> None:
+    """
+    Invalidate every cached /auth/me payload for several users, e.g. all
+    members of a changed department, in two round-trips regardless of count.
+    """
+    if not user_ids:
+        return
+    user_keys = [f"authme:user:{user_id}" for user_id in user_ids]
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for user_key in user_keys:
+                pipe.smembers(user_key)
+            token_hash_sets = await pipe.execute()
+        keys = [
+            f"authme:{h.decode() if isinstance(h, bytes) else h}"
+            for token_hashes in token_hash_sets
+            for h in token_hashes
+        ]
+        await redis_client.delete(*user_keys, *keys)
+        logger.info(f"Invalidated {len(keys)} /auth/me cache entries for {len(user_ids)} users")
+    except Exception as e:
+        logger.error(f"Error invalidating /auth/me cache for users {user_ids}: {e}")
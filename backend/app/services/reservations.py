@@ -1,124 +1,297 @@
-from datetime import datetime, timezone
+from contextlib import asynccontextmanager, nullcontext
+from datetime import date, datetime
 from decimal import Decimal
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import logging
-from pytz import timezone as pytz_timezone  # Add to requirements!
+
+from app.core.database_pool import db_pool
 
 logger = logging.getLogger(__name__)
 
+
+class RevenueCalcError(Exception):
+    """Raised when revenue cannot be calculated because the database failed."""
+
+    def __init__(self, property_id: Optional[str] = None, property_ids: Optional[List[str]] = None):
+        self.property_ids = list(property_ids) if property_ids is not None else [property_id]
+        self.property_id = property_id
+        if len(self.property_ids) == 1:
+            message = f"Failed to calculate revenue for property {self.property_ids[0]}"
+        else:
+            message = f"Failed to calculate revenue for {len(self.property_ids)} properties"
+        super().__init__(message)
+
+
+# Revenue for one month in the property's local time. Postgres derives the
+# month boundaries with AT TIME ZONE, and the property's own timezone is read
+# in the same query when the caller does not pass one.
+MONTHLY_REVENUE_QUERY = """
+    WITH bounds AS (
+        SELECT
+            p.id,
+            p.tenant_id,
+            make_timestamp($3, $4, 1, 0, 0, 0) as local_start,
+            COALESCE($5, p.timezone, 'UTC') as tz
+        FROM properties p
+        WHERE p.id = $1
+        AND p.tenant_id = $2
+    )
+    SELECT SUM(r.total_amount) as total
+    FROM bounds b
+    JOIN reservations r
+        ON r.property_id = b.id
+        AND r.tenant_id = b.tenant_id
+    WHERE r.check_in_date >= (b.local_start AT TIME ZONE b.tz)
+    AND r.check_in_date < ((b.local_start + interval '1 month') AT TIME ZONE b.tz)
+"""
+
+# Monthly revenue for a window of months in the property's local time; month
+# boundaries are computed by Postgres so one query covers the whole window.
+# The timezone is resolved the same way as in MONTHLY_REVENUE_QUERY.
+MONTHLY_REVENUE_RANGE_QUERY = """
+    WITH bounds AS (
+        SELECT
+            p.id,
+            p.tenant_id,
+            COALESCE($3, p.timezone, 'UTC') as tz
+        FROM properties p
+        WHERE p.id = $1
+        AND p.tenant_id = $2
+    )
+    SELECT
+        date_trunc('month', r.check_in_date AT TIME ZONE b.tz)::date as month,
+        SUM(r.total_amount) as total_revenue
+    FROM bounds b
+    JOIN reservations r
+        ON r.property_id = b.id
+        AND r.tenant_id = b.tenant_id
+    WHERE r.check_in_date >= ($4::timestamp AT TIME ZONE b.tz)
+    AND r.check_in_date < (($4::timestamp + make_interval(months => $5)) AT TIME ZONE b.tz)
+    GROUP BY 1
+"""
+
+# Property access check and revenue aggregate in one round-trip:
+# no row means the property does not belong to this tenant
+TOTAL_REVENUE_QUERY = """
+    SELECT
+        p.id as property_id,
+        SUM(r.total_amount) as total_revenue,
+        COUNT(r.id) as reservation_count
+    FROM properties p
+    LEFT JOIN reservations r
+        ON r.property_id = p.id
+        AND r.tenant_id = p.tenant_id
+    WHERE p.id = $1
+    AND p.tenant_id = $2
+    GROUP BY p.id
+"""
+
+# Same as TOTAL_REVENUE_QUERY for a list of properties; only properties owned
+# by the tenant produce a row. Rows carry the 1-based position of the requested
+# id in $2 so results are keyed by the id as the caller spelled it, not by
+# Postgres's canonical text form. The CTE comes first so $2 takes the type of
+# properties.id before generate_subscripts sees it.
+TOTAL_REVENUE_BATCH_QUERY = """
+    WITH owned AS (
+        SELECT p.id, p.tenant_id
+        FROM properties p
+        WHERE p.tenant_id = $1
+        AND p.id = ANY($2)
+    )
+    SELECT
+        i as position,
+        SUM(r.total_amount) as total_revenue,
+        COUNT(r.id) as reservation_count
+    FROM owned p
+    JOIN generate_subscripts($2, 1) i
+        ON p.id = $2[i]
+    LEFT JOIN reservations r
+        ON r.property_id = p.id
+        AND r.tenant_id = p.tenant_id
+    GROUP BY i
+"""
+
+
+@asynccontextmanager
+async def _revenue_connection(session=None):
+    """
+    Yield the asyncpg connection behind the given session, or behind a session
+    opened from the app-wide pool initialized at startup.
+
+    Revenue queries run on the driver connection directly, skipping
+    SQLAlchemy's text() compilation; asyncpg prepares each statement once per
+    connection and reuses it from its statement cache.
+    """
+    if session is None and not db_pool.session_factory:
+        raise Exception("Database pool not available")
+
+    session_cm = nullcontext(session) if session is not None else db_pool.get_session()
+    async with session_cm as session:
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        yield raw_connection.driver_connection
+
 async def calculate_monthly_revenue(
-    property_id: str, 
-    month: int, 
-    year: int, 
+    property_id: str,
+    month: int,
+    year: int,
     tenant_id: str,  # ADDED: tenant_id parameter!
-    property_timezone: str = 'UTC',  # Should come from properties table
-    db_session=None
+    property_timezone: Optional[str] = None,  # Defaults to the properties table value
+    session=None
 ) -> Decimal:
     """
     Calculates revenue for a specific month with proper timezone handling.
+    Month boundaries are computed in the property's timezone by Postgres.
     """
-    # FIX: Use timezone-aware datetimes
-    from app.services.properties import get_property_timezone  # hypothetical function
-    
-    # Get property's timezone from database
-    if not property_timezone:
-        property_timezone = await get_property_timezone(property_id, tenant_id)
-    
-    # Create timezone-aware start and end dates in property's local time
-    tz = pytz_timezone(property_timezone)
-    start_date = tz.localize(datetime(year, month, 1, 0, 0, 0))
-    
-    if month < 12:
-        end_date = tz.localize(datetime(year, month + 1, 1, 0, 0, 0))
-    else:
-        end_date = tz.localize(datetime(year + 1, 1, 1, 0, 0, 0))
-    
-    # Convert to UTC for database query (if DB stores UTC)
-    start_date_utc = start_date.astimezone(timezone.utc)
-    end_date_utc = end_date.astimezone(timezone.utc)
-    
-    logger.info(f"Querying revenue for property {property_id} (tenant: {tenant_id})")
-    logger.info(f"Local time range: {start_date} to {end_date}")
-    logger.info(f"UTC time range: {start_date_utc} to {end_date_utc}")
-
-    # SQL with proper tenant filtering
-    query = """
-        SELECT SUM(total_amount) as total
-        FROM reservations
-        WHERE property_id = $1
-        AND tenant_id = $2
-        AND check_in_date >= $3
-        AND check_in_date < $4
+    try:
+        async with _revenue_connection(session) as conn:
+            logger.info(
+                f"Querying revenue for property {property_id} (tenant: {tenant_id}), "
+                f"{year}-{month:02d} ({property_timezone or 'property timezone'})"
+            )
+
+            result = await conn.fetchval(
+                MONTHLY_REVENUE_QUERY,
+                property_id, tenant_id, year, month, property_timezone
+            )
+            return Decimal(str(result)) if result is not None else Decimal('0')
+
+    except Exception as e:
+        logger.error(
+            f"Database error calculating monthly revenue for property {property_id} (tenant: {tenant_id}): {e}",
+            exc_info=logger.isEnabledFor(logging.DEBUG)
+        )
+        raise RevenueCalcError(property_id) from e
+
+async def calculate_monthly_revenue_range(
+    property_id: str,
+    tenant_id: str,
+    start: date,
+    months_n: int,
+    property_timezone: Optional[str] = None,  # Defaults to the properties table value
+    session=None
+) -> Dict[date, Decimal]:
     """
-    
-    # Execute query with UTC dates
-    # result = await db.fetch_val(query, property_id, tenant_id, start_date_utc, end_date_utc)
-    # return result or Decimal('0')
-    
-    return Decimal('0')  # Placeholder
-
-async def calculate_total_revenue(property_id: str, tenant_id: str) -> Dict[str, Any]:
+    Calculates revenue for months_n consecutive months starting at the month
+    of start, in a single query instead of one query per month.
+
+    Returns a mapping of each month's first day to its revenue; months
+    without reservations map to Decimal('0').
+    """
+    if months_n <= 0:
+        return {}
+
+    start_month = datetime(start.year, start.month, 1)
+    months = []
+    for offset in range(months_n):
+        year, month = divmod(start.month - 1 + offset, 12)
+        months.append(date(start.year + year, month + 1, 1))
+
+    try:
+        async with _revenue_connection(session) as conn:
+            logger.info(
+                f"Calculating revenue for property {property_id} (tenant: {tenant_id}), "
+                f"{months_n} months from {months[0]:%Y-%m} ({property_timezone or 'property timezone'})"
+            )
+
+            rows = await conn.fetch(
+                MONTHLY_REVENUE_RANGE_QUERY,
+                property_id, tenant_id, property_timezone, start_month, months_n
+            )
+
+            totals = {row["month"]: Decimal(str(row["total_revenue"])) for row in rows}
+            return {month: totals.get(month, Decimal('0')) for month in months}
+
+    except Exception as e:
+        logger.error(
+            f"Database error calculating monthly revenue for property {property_id} (tenant: {tenant_id}): {e}",
+            exc_info=logger.isEnabledFor(logging.DEBUG)
+        )
+        raise RevenueCalcError(property_id) from e
+
+async def calculate_total_revenue(property_id: str, tenant_id: str, session=None) -> Optional[Dict[str, Any]]:
     """
     Aggregates revenue from database.
     REMOVED: Mock data fallback - now fails properly!
+
+    The same query verifies that the property belongs to the tenant; returns
+    None when it does not. The total is returned as a string formatted to two
+    decimal places.
+    Uses the given session (e.g. from the get_db_session dependency) or opens
+    one from the app-wide pool initialized at startup.
     """
     try:
-        # Import database pool
-        from app.core.database_pool import DatabasePool
-        
-        # Initialize pool if needed
-        db_pool = DatabasePool()
-        await db_pool.initialize()
-        
-        if db_pool.session_factory:
-            async with db_pool.get_session() as session:
-                from sqlalchemy import text
-                
-                # FIX: Added logging to track queries
-                logger.info(f"Calculating revenue for property {property_id}, tenant {tenant_id}")
-                
-                query = text("""
-                    SELECT 
-                        property_id,
-                        SUM(total_amount) as total_revenue,
-                        COUNT(*) as reservation_count
-                    FROM reservations 
-                    WHERE property_id = :property_id 
-                    AND tenant_id = :tenant_id
-                    GROUP BY property_id
-                """)
-                
-                result = await session.execute(query, {
-                    "property_id": property_id, 
-                    "tenant_id": tenant_id
-                })
-                row = result.fetchone()
-                
-                if row:
-                    total_revenue = Decimal(str(row.total_revenue))
-                    logger.info(f"Found revenue {total_revenue} for property {property_id}")
-                    return {
-                        "property_id": property_id,
-                        "tenant_id": tenant_id,
-                        "total": str(total_revenue),
-                        "currency": "USD", 
-                        "count": row.reservation_count
-                    }
-                else:
-                    logger.info(f"No reservations found for property {property_id}, tenant {tenant_id}")
-                    return {
-                        "property_id": property_id,
-                        "tenant_id": tenant_id,
-                        "total": "0.00",
-                        "currency": "USD",
-                        "count": 0
-                    }
-        else:
-            raise Exception("Database pool not available")
-            
+        async with _revenue_connection(session) as conn:
+            # FIX: Added logging to track queries
+            logger.info(f"Calculating revenue for property {property_id}, tenant {tenant_id}")
+
+            row = await conn.fetchrow(TOTAL_REVENUE_QUERY, property_id, tenant_id)
+
+            if not row:
+                logger.warning(f"Property {property_id} not found for tenant {tenant_id}")
+                return None
+
+            if row["reservation_count"]:
+                total_revenue = Decimal(str(row["total_revenue"]))
+                logger.info(f"Found revenue {total_revenue} for property {property_id}")
+                return {
+                    "property_id": property_id,
+                    "tenant_id": tenant_id,
+                    "total": f"{total_revenue:.2f}",
+                    "currency": "USD",
+                    "count": row["reservation_count"]
+                }
+            else:
+                logger.info(f"No reservations found for property {property_id}, tenant {tenant_id}")
+                return {
+                    "property_id": property_id,
+                    "tenant_id": tenant_id,
+                    "total": "0.00",
+                    "currency": "USD",
+                    "count": 0
+                }
+
     except Exception as e:
         # FIX: Log error and re-raise - NO MOCK DATA IN PRODUCTION!
-        logger.error(f"Database error calculating revenue for property {property_id} (tenant: {tenant_id}): {e}", exc_info=True)
-        
-        # Either re-raise or return a proper error response
-        raise Exception(f"Failed to calculate revenue for property {property_id}: {str(e)}")
\ No newline at end of file
+        # Tracebacks only at DEBUG: formatting one per request is costly during a DB outage
+        logger.error(
+            f"Database error calculating revenue for property {property_id} (tenant: {tenant_id}): {e}",
+            exc_info=logger.isEnabledFor(logging.DEBUG)
+        )
+        raise RevenueCalcError(property_id) from e
+
+
+async def calculate_total_revenue_batch(property_ids: List[str], tenant_id: str, session=None) -> Dict[str, Dict[str, Any]]:
+    """
+    Aggregates revenue for several properties of one tenant in a single query.
+    Properties without reservations get a zero summary; properties that do not
+    belong to the tenant are left out of the result.
+    """
+    if not property_ids:
+        return {}
+
+    try:
+        async with _revenue_connection(session) as conn:
+            logger.info(f"Calculating revenue for {len(property_ids)} properties, tenant {tenant_id}")
+
+            property_ids = list(property_ids)
+            rows = await conn.fetch(TOTAL_REVENUE_BATCH_QUERY, tenant_id, property_ids)
+
+            summaries = {}
+            for row in rows:
+                property_id = property_ids[row["position"] - 1]
+                summaries[property_id] = {
+                    "property_id": property_id,
+                    "tenant_id": tenant_id,
+                    "total": f"{Decimal(str(row['total_revenue'])):.2f}" if row["reservation_count"] else "0.00",
+                    "currency": "USD",
+                    "count": row["reservation_count"]
+                }
+            return summaries
+
+    except Exception as e:
+        logger.error(
+            f"Database error calculating batch revenue for tenant {tenant_id}: {e}",
+            exc_info=logger.isEnabledFor(logging.DEBUG)
+        )
+        raise RevenueCalcError(property_ids=property_ids) from e